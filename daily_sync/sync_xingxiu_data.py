@@ -3,17 +3,26 @@ Script: sync_xingxiu_data.py
 Purpose: 每天雅加达 01:30 抓“昨天”的接口数据，入库到表 `xingxiu`
 Notes:
 POST + Query Params (?dateStr=YYYY-MM-DD[&key=...])
+Usage:
+  python sync_xingxiu_data.py                        # 雅加达昨天
+  python sync_xingxiu_data.py 2025-09-01             # 指定单日
+  python sync_xingxiu_data.py 2025-09-01 2025-09-22  # 闭区间回补，多日并发抓取
+  DB_LOAD_INFILE=1：超过一批的数据改走 LOAD DATA LOCAL INFILE（需服务端 local_infile=ON）
 """
 
 import os
+import re
 import sys
 import json
 import logging
+import tempfile
+import threading
+from functools import lru_cache
 from datetime import datetime, timedelta
-from typing import List, Dict, Any
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Any, Tuple
 
-import requests
-import mysql.connector
+import orjson
 from zoneinfo import ZoneInfo
 
 # 日志
@@ -26,18 +35,64 @@ logging.basicConfig(
 # ---- 接口配置 ----
 API_URL = "http://119.47.88.14:81/admin/common/mechanical/ai_export"
 API_HEADERS = {"Accept": "application/json"}
+# (连接超时, 读取超时)：连不上的主机 5 秒内失败，尽快进入重试
+API_TIMEOUT = (5, 25)
+# 这些状态码视为临时故障，由 Session 自动退避重试
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+# 复用同一个 Session：keep-alive + 连接池，多次请求不再重复建连
+# requests / mysql.connector 较重，延迟到首次使用时再导入，参数校验失败可快速退出
+_SESSION = None
+_SESSION_LOCK = threading.Lock()
+
+def get_session():
+    global _SESSION
+    with _SESSION_LOCK:
+        if _SESSION is None:
+            import requests
+            from requests.adapters import HTTPAdapter
+            from urllib3.util.retry import Retry
+
+            # 接口是只读导出，POST 重试是安全的；重试耗尽后交给 raise_for_status 报错
+            retry = Retry(
+                total=5,
+                backoff_factor=0.5,
+                status_forcelist=RETRY_STATUSES,
+                allowed_methods=frozenset(["POST"]),
+                raise_on_status=False,
+            )
+            adapter = HTTPAdapter(pool_connections=4, pool_maxsize=16, max_retries=retry)
+            session = requests.Session()
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            _SESSION = session
+    return _SESSION
 
 def jakarta_yesterday_str() -> str:
     now_jkt = datetime.now(ZoneInfo("Asia/Jakarta"))
     return (now_jkt - timedelta(days=1)).strftime("%Y-%m-%d")
 
-# 支持命令行覆盖日期；默认“雅加达昨天”
-DATE_STR = sys.argv[1].strip() if len(sys.argv) > 1 and sys.argv[1].strip() else jakarta_yesterday_str()
+def resolve_dates(argv: List[str]) -> List[str]:
+    """
+    命令行日期：
+    - 无参数：雅加达“昨天”
+    - 一个参数：单日
+    - 两个参数：[start, end] 闭区间
+    """
+    args = [a.strip() for a in argv if a.strip()]
+    if not args:
+        return [jakarta_yesterday_str()]
+    start = datetime.strptime(args[0], "%Y-%m-%d").date()
+    end = datetime.strptime(args[1], "%Y-%m-%d").date() if len(args) > 1 else start
+    if end < start:
+        raise SystemExit(f"结束日期 {end} 早于开始日期 {start}")
+    return [(start + timedelta(days=i)).isoformat() for i in range((end - start).days + 1)]
 
 # 可选 key（Secrets 里设置 API_KEY）
-API_PARAMS = {"dateStr": DATE_STR}
-if os.getenv("API_KEY"):
-    API_PARAMS["key"] = os.getenv("API_KEY")
+API_KEY = os.getenv("API_KEY")
+
+# 多日回补时并发抓取的线程数（不超过连接池大小，也别压垮上游）
+FETCH_WORKERS = 8
 
 # ---- DB 配置（DB_NAME 设为你的库名，例如 xingxiu_db）----
 DB_CONFIG = {
@@ -50,6 +105,11 @@ DB_CONFIG = {
     "autocommit": False,
 }
 
+# 大批量回补走 LOAD DATA LOCAL INFILE（默认关闭，服务端需开启 local_infile）
+LOAD_INFILE = os.getenv("DB_LOAD_INFILE") == "1"
+if LOAD_INFILE:
+    DB_CONFIG["allow_local_infile"] = True
+
 TABLE_NAME = "xingxiu"
 
 # 建表（中文注释）
@@ -82,19 +142,22 @@ CREATE TABLE IF NOT EXISTS `{TABLE_NAME}` (
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COMMENT='星宿日报数据';
 """
 
-# 插入/更新（设备+日期去重）
-INSERT_SQL = f"""
-INSERT INTO `{TABLE_NAME}` (
-  DEVICE_NO, PROJECT_NAME, DATE_STR, RENT_TYPE, MECHANICAL_NO, CREATE_TIME,
-  TYPE_NAME, CAR_TYPE, VALID_DURATION, IDLING_DURATION, VALID_PERCENT,
-  DAY_OIL, DAY_REFUEL, DAY_MILEAGE, WORKHOUR_AVG_OIL, TRANSPORT_AVG_OIL,
-  COMPANY_ASSETS, BELONG_LAND, SCORE, SUMMARY
-) VALUES (
-  %(deviceNo)s, %(projectName)s, %(dateStr)s, %(rentType)s, %(mechanicalNo)s, %(createTime)s,
-  %(typeName)s, %(carType)s, %(validDuration)s, %(idlingDuration)s, %(validPercent)s,
-  %(dayOil)s, %(dayRefuel)s, %(dayMileage)s, %(workhourAvgOil)s, %(transportAvgOil)s,
-  %(companyAssets)s, %(belongLand)s, %(score)s, %(summary)s
-) ON DUPLICATE KEY UPDATE
+# 写入列顺序；transform 输出的元组按此顺序排列，按位置绑定 %s
+INSERT_COLUMNS = (
+    "DEVICE_NO", "PROJECT_NAME", "DATE_STR", "RENT_TYPE", "MECHANICAL_NO", "CREATE_TIME",
+    "TYPE_NAME", "CAR_TYPE", "VALID_DURATION", "IDLING_DURATION", "VALID_PERCENT",
+    "DAY_OIL", "DAY_REFUEL", "DAY_MILEAGE", "WORKHOUR_AVG_OIL", "TRANSPORT_AVG_OIL",
+    "COMPANY_ASSETS", "BELONG_LAND", "SCORE", "SUMMARY",
+)
+INSERT_COLUMNS_SQL = ", ".join(INSERT_COLUMNS)
+
+# 插入/更新（设备+日期去重）；多行 VALUES 分批拼接，一批一次往返
+INSERT_HEAD_SQL = f"""
+INSERT INTO `{TABLE_NAME}` ({INSERT_COLUMNS_SQL}) VALUES
+"""
+
+ON_DUPLICATE_SQL = """
+ON DUPLICATE KEY UPDATE
   PROJECT_NAME=VALUES(PROJECT_NAME),
   RENT_TYPE=VALUES(RENT_TYPE),
   MECHANICAL_NO=VALUES(MECHANICAL_NO),
@@ -115,18 +178,116 @@ INSERT INTO `{TABLE_NAME}` (
   SUMMARY=VALUES(SUMMARY);
 """
 
-def normalize_date(s: str) -> str:
+Record = Tuple[Any, ...]
+DEVICE_NO_IDX = INSERT_COLUMNS.index("DEVICE_NO")
+DATE_STR_IDX = INSERT_COLUMNS.index("DATE_STR")
+
+ROW_PLACEHOLDER = "(" + ", ".join(["%s"] * len(INSERT_COLUMNS)) + ")"
+
+# 每批行数：20 列 × 1000 行 = 20000 个占位符，远低于 MySQL 65535 上限
+BATCH_SIZE = 1000
+
+def build_insert_sql(n_rows: int) -> str:
+    return INSERT_HEAD_SQL + ",\n".join([ROW_PLACEHOLDER] * n_rows) + ON_DUPLICATE_SQL
+
+# 满批语句只拼一次；服务端预处理后整批复用，只有末尾不满一批的余量另行 prepare
+FULL_BATCH_SQL = build_insert_sql(BATCH_SIZE)
+
+# LOAD DATA：先灌入临时表，再 INSERT ... SELECT 合并进正式表
+# 临时表不建唯一键，重复 (设备, 日期) 全部保留，按载入顺序 (ID) 合并，由 ON DUPLICATE KEY UPDATE 决定后者覆盖；
+# 单独写 DDL 而不用 LIKE + ALTER：ALTER TABLE 即使作用于临时表也会隐式提交事务
+STAGE_TABLE = f"{TABLE_NAME}_stg"
+CREATE_STAGE_SQL = f"""
+CREATE TEMPORARY TABLE `{STAGE_TABLE}` (
+  `ID`                 BIGINT UNSIGNED NOT NULL AUTO_INCREMENT,
+  `DEVICE_NO`          VARCHAR(64)     NOT NULL,
+  `PROJECT_NAME`       VARCHAR(128),
+  `MECHANICAL_NO`      VARCHAR(64),
+  `DATE_STR`           DATE            NOT NULL,
+  `RENT_TYPE`          VARCHAR(64),
+  `TYPE_NAME`          VARCHAR(128),
+  `CAR_TYPE`           VARCHAR(64),
+  `VALID_DURATION`     DECIMAL(10,2),
+  `IDLING_DURATION`    DECIMAL(10,2),
+  `VALID_PERCENT`      DECIMAL(10,2),
+  `DAY_OIL`            DECIMAL(12,2),
+  `DAY_REFUEL`         DECIMAL(12,2),
+  `DAY_MILEAGE`        DECIMAL(12,2),
+  `WORKHOUR_AVG_OIL`   DECIMAL(12,2),
+  `TRANSPORT_AVG_OIL`  DECIMAL(12,2),
+  `COMPANY_ASSETS`     VARCHAR(128),
+  `BELONG_LAND`        VARCHAR(128),
+  `CREATE_TIME`        DATETIME,
+  `SCORE`              INT,
+  `SUMMARY`            TEXT,
+  PRIMARY KEY (`ID`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4
+"""
+DROP_STAGE_SQL = f"DROP TEMPORARY TABLE IF EXISTS `{STAGE_TABLE}`"
+LOAD_STAGE_SQL = f"""
+LOAD DATA LOCAL INFILE %s INTO TABLE `{STAGE_TABLE}`
+CHARACTER SET utf8mb4
+FIELDS TERMINATED BY '\\t' ESCAPED BY '\\\\'
+LINES TERMINATED BY '\\n'
+({INSERT_COLUMNS_SQL})
+"""
+MERGE_STAGE_SQL = f"""
+INSERT INTO `{TABLE_NAME}` ({INSERT_COLUMNS_SQL})
+SELECT {INSERT_COLUMNS_SQL} FROM `{STAGE_TABLE}` ORDER BY ID
+""" + ON_DUPLICATE_SQL
+
+_TSV_ESCAPES = str.maketrans({"\\": "\\\\", "\t": "\\t", "\n": "\\n", "\r": "\\r", "\0": "\\0"})
+
+def tsv_field(v: Any) -> str:
+    if v is None:
+        return "\\N"
+    if isinstance(v, bool):
+        return "1" if v else "0"
+    return str(v).translate(_TSV_ESCAPES)
+
+def tsv_line(rec: Tuple[Any, ...]) -> str:
+    return "\t".join(map(tsv_field, rec)) + "\n"
+
+# YYYY-MM-DD / YYYY/MM/DD（两处分隔符须一致，月日 1~2 位）或 YYYYMMDD；
+# 日期后只允许结束，或空格/T 接 H:MM[:SS[.ffffff]] 时间
+_DATE_RE = re.compile(
+    r"(\d{4})(?:([-/])(\d{1,2})\2(\d{1,2})|(\d{2})(\d{2}))"
+    r"(?:[ T]\d{1,2}:\d{2}(?::\d{2}(?:\.\d+)?)?)?"
+)
+
+def normalize_date(s: Any) -> str:
+    # 先转 str 再查缓存：接口偶尔给出 list/dict 等不可哈希值，不能让 lru_cache 抛 TypeError
+    return _normalize_date_str(str(s))
+
+# 同一批数据的 dateStr 基本相同，缓存解析结果，避免逐行重复解析
+@lru_cache(maxsize=1024)
+def _normalize_date_str(s: str) -> str:
+    m = _DATE_RE.fullmatch(s)
+    if not m:
+        return s
+    y, _, mo, d, mo_compact, d_compact = m.groups()
     try:
-        y, m, d = [int(i) for i in str(s).split("-")]
-        return datetime(y, m, d).strftime("%Y-%m-%d")
-    except Exception:
-        return str(s)
+        return datetime(int(y), int(mo or mo_compact), int(d or d_compact)).strftime("%Y-%m-%d")
+    except ValueError:
+        return s
 
-def fetch_api() -> List[Dict[str, Any]]:
-    logging.info(f"POST {API_URL} params={API_PARAMS}")
-    r = requests.post(API_URL, headers=API_HEADERS, params=API_PARAMS, timeout=20)
-    r.raise_for_status()
-    data = r.json()
+def fetch_api(date_str: str) -> List[Dict[str, Any]]:
+    params = {"dateStr": date_str}
+    if API_KEY:
+        params["key"] = API_KEY
+    logging.info("POST %s dateStr=%s", API_URL, date_str)
+    r = get_session().post(API_URL, headers=API_HEADERS, params=params, timeout=API_TIMEOUT)
+    if not r.ok:
+        if r.status_code in RETRY_STATUSES:
+            logging.error("%s: API 请求失败 HTTP %d，重试已用尽：%s", date_str, r.status_code, r.text[:200])
+        else:
+            logging.error("%s: API 请求失败 HTTP %d：%s", date_str, r.status_code, r.text[:200])
+        r.raise_for_status()
+    # 按 UTF-8 解析；带 BOM 或非 UTF-8 编码时退回 r.json()（由 requests 探测编码）
+    try:
+        data = orjson.loads(r.content)
+    except orjson.JSONDecodeError:
+        data = r.json()
     # 兼容 list 或 {dataList/result/data}
     if isinstance(data, list):
         lst = data
@@ -136,52 +297,127 @@ def fetch_api() -> List[Dict[str, Any]]:
         raise RuntimeError("API dataList 不是列表")
     return lst
 
-def transform(records: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+# 高重复字符串池（跨日期共享；dict.setdefault 在多线程下也是原子的）
+_STR_POOL: Dict[str, str] = {}
+
+def share(v: Any) -> Any:
+    return _STR_POOL.setdefault(v, v) if isinstance(v, str) else v
+
+def transform(records: List[Dict[str, Any]], date_str: str) -> List[Record]:
     """
-    把每条记录补齐 INSERT 所需的全部键；
-    - dateStr 缺省用雅加达“昨天” (DATE_STR)
+    把每条记录转成 INSERT 所需的 20 列元组（顺序同 INSERT_COLUMNS）；
+    - dateStr 缺省用请求的日期 (date_str)
     - 兼容若干大小写或别名字段
+    - 项目/类型/归属等高重复字符串共用同一对象，减少内存占用
     """
-    out: List[Dict[str, Any]] = []
+    out: List[Record] = []
     for r in records:
-        rec = {
+        rec = (
             # 唯一键
-            "deviceNo":        r.get("deviceNo") or r.get("DEVICE_NO") or "",
-            "projectName":     r.get("projectName"),
-            "dateStr":         normalize_date(r.get("dateStr") or DATE_STR),
+            r.get("deviceNo") or r.get("DEVICE_NO") or "",        # DEVICE_NO
+            share(r.get("projectName")),                          # PROJECT_NAME
+            normalize_date(r.get("dateStr") or date_str),         # DATE_STR
 
             # 其它字段（可为 None）
-            "rentType":        r.get("rentType"),
-            "mechanicalNo":    r.get("mechanicalNo"),
-            "createTime":      r.get("createTime"),
-            "typeName":        r.get("typeName"),
-            "carType":         r.get("carType") or r.get("catType"),
-
-            "validDuration":   r.get("validDuration"),
-            "idlingDuration":  r.get("idlingDuration") or r.get("idingDuration"),
-            "validPercent":    r.get("validPercent"),
-            "dayOil":          r.get("dayOil"),
-            "dayRefuel":       r.get("dayRefuel"),
-            "dayMileage":      r.get("dayMileage"),
-
-            "workhourAvgOil":  r.get("workhourAvgOil") or r.get("workHourAvgOil"),
-            "transportAvgOil": r.get("transportAvgOil"),
-
-            "companyAssets":   r.get("companyAssets"),
-            "belongLand":      r.get("belongLand"),
-            "score":           r.get("score"),
-            "summary":         r.get("summary"),
-        }
+            share(r.get("rentType")),                             # RENT_TYPE
+            r.get("mechanicalNo"),                                # MECHANICAL_NO
+            r.get("createTime"),                                  # CREATE_TIME
+            share(r.get("typeName")),                             # TYPE_NAME
+            share(r.get("carType") or r.get("catType")),          # CAR_TYPE
+
+            r.get("validDuration"),                               # VALID_DURATION
+            r.get("idlingDuration") or r.get("idingDuration"),    # IDLING_DURATION
+            r.get("validPercent"),                                # VALID_PERCENT
+            r.get("dayOil"),                                      # DAY_OIL
+            r.get("dayRefuel"),                                   # DAY_REFUEL
+            r.get("dayMileage"),                                  # DAY_MILEAGE
+
+            r.get("workhourAvgOil") or r.get("workHourAvgOil"),   # WORKHOUR_AVG_OIL
+            r.get("transportAvgOil"),                             # TRANSPORT_AVG_OIL
+
+            share(r.get("companyAssets")),                        # COMPANY_ASSETS
+            share(r.get("belongLand")),                           # BELONG_LAND
+            r.get("score"),                                       # SCORE
+            r.get("summary"),                                     # SUMMARY
+        )
         out.append(rec)
     return out
 
+def dedupe(records: List[Record]) -> List[Record]:
+    """按 (DEVICE_NO, DATE_STR) 去重，后出现的覆盖先出现的（与 ON DUPLICATE KEY UPDATE 语义一致）"""
+    latest: Dict[Tuple[Any, Any], Record] = {}
+    for rec in records:
+        latest[(rec[DEVICE_NO_IDX], rec[DATE_STR_IDX])] = rec
+    return list(latest.values())
+
+def fetch_day(date_str: str) -> List[Record]:
+    """
+    抓取并转换单日数据；在抓取线程里直接 transform，
+    原始响应（含接口多余字段）随即释放，不会在多日回补时整体堆积在内存里
+    """
+    rows = fetch_api(date_str)
+    logging.info("%s: API 返回 %d 条", date_str, len(rows))
+    if rows:
+        logging.debug("样例 device/date：(%s, %s)", rows[0].get("deviceNo"), rows[0].get("dateStr"))
+    return transform(rows, date_str)   # ← 关键：先补齐字段
+
 def get_conn():
+    import mysql.connector
     return mysql.connector.connect(**DB_CONFIG)
 
+# 进程内只检查一次表是否存在；表已存在时不再执行 DDL（避免每次同步都拿元数据锁）
+_TABLE_READY = False
+
 def ensure_table(cur):
-    cur.execute(TABLE_SCHEMA_SQL)
+    global _TABLE_READY
+    if _TABLE_READY:
+        return
+    cur.execute("SHOW TABLES LIKE %s", (TABLE_NAME,))
+    if not cur.fetchall():
+        cur.execute(TABLE_SCHEMA_SQL)
+    _TABLE_READY = True
+
+def upsert_batches(conn, cur, records: List[Record]) -> int:
+    # 不满一批（日常同步）：普通游标执行一次即可，prepare/close 只会多两次往返
+    if len(records) <= BATCH_SIZE:
+        cur.execute(build_insert_sql(len(records)), [v for rec in records for v in rec])
+        return cur.rowcount
+    # 多批（回补）：服务端预处理语句，相同 SQL 文本只 parse 一次，满批之间复用
+    cur = conn.cursor(prepared=True)
+    try:
+        affected = 0
+        for i in range(0, len(records), BATCH_SIZE):
+            chunk = records[i:i + BATCH_SIZE]
+            params = [v for rec in chunk for v in rec]
+            sql = FULL_BATCH_SQL if len(chunk) == BATCH_SIZE else build_insert_sql(len(chunk))
+            cur.execute(sql, params)
+            affected += cur.rowcount
+        return affected
+    finally:
+        cur.close()
+
+def load_via_infile(cur, records: List[Record]) -> int:
+    with tempfile.NamedTemporaryFile("w", encoding="utf-8", newline="", suffix=".tsv", delete=False) as f:
+        for rec in records:
+            f.write(tsv_line(rec))
+        path = f.name
+    try:
+        cur.execute(DROP_STAGE_SQL)
+        cur.execute(CREATE_STAGE_SQL)
+        cur.execute(LOAD_STAGE_SQL, (path,))
+        # LOCAL 模式下转换错误只报 warning（空值/非法值被写成 0 或零日期），
+        # 与 VALUES 路径在严格模式下直接报错不一致；有 warning 即失败并回滚
+        if cur.warning_count:
+            raise RuntimeError(f"LOAD DATA 产生 {cur.warning_count} 条 warning，已回滚")
+        logging.info("LOAD DATA 载入临时表 %d 条", cur.rowcount)
+        cur.execute(MERGE_STAGE_SQL)
+        affected = cur.rowcount
+        cur.execute(DROP_STAGE_SQL)
+        return affected
+    finally:
+        os.unlink(path)
 
-def insert_records(records: List[Dict[str, Any]]):
+def insert_records(records: List[Record]):
     if not records:
         logging.info("无新增数据")
         return
@@ -189,21 +425,33 @@ def insert_records(records: List[Dict[str, Any]]):
     cur = conn.cursor()
     try:
         ensure_table(cur)
-        cur.executemany(INSERT_SQL, records)
+        # autocommit=False：整个日期区间的所有批次在同一个事务里，最后只提交一次；
+        # 不关闭 unique_checks：ON DUPLICATE KEY UPDATE 依赖 uniq_device_date 判重
+        if LOAD_INFILE and len(records) > BATCH_SIZE:
+            affected = load_via_infile(cur, records)
+        else:
+            affected = upsert_batches(conn, cur, records)
         conn.commit()
-        logging.info(f"写入 {cur.rowcount} 条")
+        logging.info("写入 %d 条", affected)
+    except Exception:
+        conn.rollback()
+        raise
     finally:
         cur.close()
         conn.close()
 
 def main():
-    logging.info(f"开始同步（雅加达昨天={DATE_STR}）")
-    rows = fetch_api()
-    logging.info(f"API 返回 {len(rows)} 条")
-    if rows:
-        logging.info(f"样例 device/date：({rows[0].get('deviceNo')}, {rows[0].get('dateStr')})")
-    records = transform(rows)          # ← 关键：先补齐字段
-    insert_records(records)
+    dates = resolve_dates(sys.argv[1:])
+    logging.info("开始同步（%s ~ %s，共 %d 天）", dates[0], dates[-1], len(dates))
+    records: List[Record] = []
+    # 多日并发抓取（纯 I/O 等待），按日期顺序汇总后一次性批量写入
+    with ThreadPoolExecutor(max_workers=min(FETCH_WORKERS, len(dates))) as pool:
+        for recs in pool.map(fetch_day, dates):
+            records.extend(recs)
+    unique = dedupe(records)
+    if len(unique) < len(records):
+        logging.info("去重 %d 条重复 (设备, 日期)", len(records) - len(unique))
+    insert_records(unique)
     logging.info("完成")
 
 if __name__ == "__main__":
@@ -0,0 +1,132 @@
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from sync_xingxiu_data import (
+    DATE_STR_IDX,
+    DEVICE_NO_IDX,
+    INSERT_COLUMNS,
+    dedupe,
+    jakarta_yesterday_str,
+    normalize_date,
+    resolve_dates,
+    transform,
+    tsv_field,
+    tsv_line,
+)
+
+
+class NormalizeDateTest(unittest.TestCase):
+    def test_valid_inputs_are_normalized(self):
+        cases = {
+            "2025-09-01": "2025-09-01",
+            "2025-9-1": "2025-09-01",
+            "2025/09/01": "2025-09-01",
+            "20250901": "2025-09-01",
+            "2025-09-01 12:00:00": "2025-09-01",
+            "2025-09-01T12:00:00": "2025-09-01",
+            "2025-09-01 8:30": "2025-09-01",
+            "2025-09-01 12:00:00.123": "2025-09-01",
+        }
+        for raw, expected in cases.items():
+            with self.subTest(raw=raw):
+                self.assertEqual(normalize_date(raw), expected)
+
+    def test_malformed_inputs_are_returned_unchanged(self):
+        for raw in [
+            "202511", "2025112", "20251-1", "2025-091", "2025-1/5",
+            "2025-02-30", "2025-13-01", "2025-09-011", "2025-09-01x", "bad", "",
+            "2025-09-01 ~ 2025-09-07", "20250901 xyz", "2025-09-01T", "2025-09-01 ",
+            "2025-09-01 12:00:00x",
+        ]:
+            with self.subTest(raw=raw):
+                self.assertEqual(normalize_date(raw), raw)
+
+    def test_unhashable_input_is_stringified(self):
+        self.assertEqual(normalize_date(["2025-09-01"]), "['2025-09-01']")
+        self.assertEqual(normalize_date({"d": 1}), "{'d': 1}")
+
+
+class ResolveDatesTest(unittest.TestCase):
+    def test_no_args_is_jakarta_yesterday(self):
+        self.assertEqual(resolve_dates([]), [jakarta_yesterday_str()])
+
+    def test_whitespace_only_args_are_ignored(self):
+        self.assertEqual(resolve_dates(["  ", ""]), [jakarta_yesterday_str()])
+
+    def test_single_day(self):
+        self.assertEqual(resolve_dates([" 2025-09-01 "]), ["2025-09-01"])
+
+    def test_inclusive_range(self):
+        self.assertEqual(
+            resolve_dates(["2025-08-30", "2025-09-02"]),
+            ["2025-08-30", "2025-08-31", "2025-09-01", "2025-09-02"],
+        )
+
+    def test_end_before_start_exits(self):
+        with self.assertRaises(SystemExit):
+            resolve_dates(["2025-09-02", "2025-09-01"])
+
+
+class TransformTest(unittest.TestCase):
+    def test_row_tuple_matches_insert_columns(self):
+        (rec,) = transform([{"deviceNo": "D1", "dateStr": "2025/09/01"}], "2025-09-02")
+        self.assertEqual(len(rec), len(INSERT_COLUMNS))
+        self.assertEqual(rec[DEVICE_NO_IDX], "D1")
+        self.assertEqual(rec[DATE_STR_IDX], "2025-09-01")
+
+
+class DedupeTest(unittest.TestCase):
+    def test_last_row_wins_per_device_and_date(self):
+        score_idx = INSERT_COLUMNS.index("SCORE")
+        day1 = transform([
+            {"deviceNo": "A", "dateStr": "2025/09/01", "score": 1},
+            {"deviceNo": "B", "dateStr": "2025-09-01", "score": 2},
+            {"deviceNo": "A", "dateStr": "2025-09-01", "score": 3},
+        ], "2025-09-01")
+        day2 = transform([
+            {"deviceNo": "A", "dateStr": "2025-09-02", "score": 4},
+            {"deviceNo": "B", "dateStr": "20250901", "score": 5},
+        ], "2025-09-02")
+
+        rows = dedupe(day1 + day2)
+
+        self.assertEqual(
+            [(r[DEVICE_NO_IDX], r[DATE_STR_IDX], r[score_idx]) for r in rows],
+            [("A", "2025-09-01", 3), ("B", "2025-09-01", 5), ("A", "2025-09-02", 4)],
+        )
+
+
+class TsvTest(unittest.TestCase):
+    def test_field_escapes(self):
+        cases = [
+            ("a\tb", "a\\tb"),
+            ("a\nb", "a\\nb"),
+            ("a\rb", "a\\rb"),
+            ("a\\b", "a\\\\b"),
+            ("a\0b", "a\\0b"),
+            (None, "\\N"),
+            (True, "1"),
+            (False, "0"),
+            (0, "0"),
+            ("1.50", "1.50"),
+        ]
+        for raw, expected in cases:
+            with self.subTest(raw=raw):
+                self.assertEqual(tsv_field(raw), expected)
+
+    def test_row_serialises_to_one_field_per_column(self):
+        (rec,) = transform(
+            [{"deviceNo": "D1", "dateStr": "2025-09-01", "summary": "x\ty\nz\\", "score": None}],
+            "2025-09-01",
+        )
+        line = tsv_line(rec)
+        self.assertTrue(line.endswith("\n"))
+        self.assertEqual(line.count("\n"), 1)
+        self.assertEqual(len(line[:-1].split("\t")), len(INSERT_COLUMNS))
+
+
+if __name__ == "__main__":
+    unittest.main()